@@ -1,55 +1,186 @@
+import contextlib
+import csv
+import functools
 import json
-from collections import defaultdict
-from dataclasses import dataclass
+import os
+import zipfile
+from dataclasses import dataclass, fields, replace
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Dict, Iterator, List, Optional
 
 import click
-import pandas as pd
+import numpy as np
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Minimum detention periods (in days, between vesting and sale) to be eligible for tax relief
+_MIN_DETENTION_50P_DAYS = 2 * 365
+_MIN_DETENTION_65P_DAYS = 8 * 365
+
+# Version of the layout of the exchange rate cache file, to bump whenever its content changes
+_EXCHANGE_RATE_CACHE_VERSION = 1
+
+
+@contextlib.contextmanager
+def _atomic_write(path: Path) -> Iterator[BinaryIO]:
+    """
+    Opens a temporary file next to `path` for writing, and moves it to `path` once it is complete.
+
+    If writing fails or is interrupted, the temporary file is removed and `path` is left untouched.
+
+    Args:
+        path (Path): The file to write.
+
+    Yields:
+        BinaryIO: The temporary file, opened in binary mode.
+    """
+    # Unique per process, and opened like a regular file so the usual permissions apply
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
 
 class ExchangeRateData:
     def __init__(self, exchange_rate_csv: Optional[Path]):
         self.exchange_rate_csv = exchange_rate_csv
-        self.usd_change_rate_by_day = {}
         if not self.exchange_rate_csv or not self.exchange_rate_csv.is_file():
             self._download_exchange_rate_data()
-        self._load_exchange_rate_data()
+        if not self._load_cached_exchange_rate_data():
+            self._load_exchange_rate_data()
+            self._save_cached_exchange_rate_data()
 
     def _download_exchange_rate_data(self):
         # This link is given on this page https://webstat.banque-france.fr/fr/questions-frequentes/
         # It contains the exchange rates for many currencies, including EUR to USD, starting from 1999.
         url = "https://webstat.banque-france.fr/export/csv-columns/fr/selection/5385698"
-        response = requests.get(url)
-        if response.status_code == 200:
-            self.exchange_rate_csv = Path("exchange_rate.csv")
-            with open(self.exchange_rate_csv, "wb") as file:
-                file.write(response.content)
-            print("Downloaded exchange rate data to exchange_rate.csv")
-        else:
-            raise FileNotFoundError(
-                "Failed to download the exchange rate data. Try downloading the file manually."
-            )
+        # Stream the response to the file instead of holding the whole file in memory
+        # (requests asks for a gzip-compressed response and decompresses it on the fly)
+        with requests.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise FileNotFoundError(
+                    "Failed to download the exchange rate data. Try downloading the file manually."
+                )
+            # The file is only moved into place once the whole response has been received,
+            # so a dropped connection cannot leave a truncated file behind
+            exchange_rate_csv = Path("exchange_rate.csv")
+            with _atomic_write(exchange_rate_csv) as file:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    file.write(chunk)
+            self.exchange_rate_csv = exchange_rate_csv
+        print("Downloaded exchange rate data to exchange_rate.csv")
+
+    @property
+    def _cache_file(self) -> Path:
+        # The parsed rates are cached next to the CSV file, as NumPy arrays
+        return self.exchange_rate_csv.with_suffix(".npz")
+
+    def _load_cached_exchange_rate_data(self) -> bool:
+        try:
+            csv_stat = self.exchange_rate_csv.stat()
+            with np.load(self._cache_file) as cache:
+                # The cache is only valid for the current layout,
+                # and for the exact CSV file it was built from
+                if (
+                    int(cache["version"]) != _EXCHANGE_RATE_CACHE_VERSION
+                    or int(cache["source_mtime_ns"]) != csv_stat.st_mtime_ns
+                    or int(cache["source_size"]) != csv_stat.st_size
+                ):
+                    return False
+                first_date = cache["first_date"]
+                daily_rates = cache["daily_rates"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Missing, unreadable or corrupted cache: parse the CSV file again
+            return False
+        self._first_date = first_date
+        self._daily_rates = daily_rates
+        return True
+
+    def _save_cached_exchange_rate_data(self):
+        try:
+            with _atomic_write(self._cache_file) as file:
+                np.savez(
+                    file,
+                    version=_EXCHANGE_RATE_CACHE_VERSION,
+                    source_mtime_ns=self._csv_stat.st_mtime_ns,
+                    source_size=self._csv_stat.st_size,
+                    first_date=self._first_date,
+                    daily_rates=self._daily_rates,
+                )
+        except OSError:
+            # The cache is only an optimization, we can live without it
+            pass
 
     def _load_exchange_rate_data(self):
         # The format of this file is a bit weird.
         # The first 5 rows are not useful in our case.
-        # The first column is the date in the format "dd/mm/YYYY", and it's called "Titre :"
-        df = pd.read_csv(self.exchange_rate_csv, sep=";")
+        # The first column is the date in the format "YYYY-MM-DD", and it's called "Titre :"
         usd_column = "Dollar des Etats-Unis (USD)"
-        df_usd = df[["Titre :", usd_column]]
-        df_usd = df_usd.iloc[5:]
+        # Identifies the parsed file in the cache (taken before reading, so a concurrent update invalidates it)
+        self._csv_stat = self.exchange_rate_csv.stat()
+        with open(self.exchange_rate_csv, newline="", encoding="utf-8-sig") as file:
+            reader = csv.reader(file, delimiter=";")
+            header = next(reader)
+            date_index = header.index("Titre :")
+            usd_index = header.index(usd_column)
+            for _ in range(5):
+                next(reader)
+            rows = [(row[date_index], row[usd_index]) for row in reader if row]
+
         # The column contains the exchange rate as a string of format "1,2345"
-        # and "-" during the week-ends. We replace the "-" with the last known value.
-        df_usd[usd_column] = df_usd[usd_column].replace("-", method="bfill")
-        df_usd[usd_column] = df_usd[usd_column].str.replace(",", ".").astype(float)
+        # and "-" during the week-ends, which use the last known rate.
+        dates = np.array(
+            [date_str for date_str, usd in rows if usd != "-"], dtype="datetime64[D]"
+        )
+        rates = np.array(
+            [float(usd.replace(",", ".")) for _, usd in rows if usd != "-"],
+            dtype=np.float64,
+        )
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        rates = rates[order]
+        # The file covers every day up to its most recent date, even if it has no rate
+        # (ISO dates can be compared as strings)
+        last_date = np.datetime64(max(date_str for date_str, _ in rows), "D")
+
+        # Store one rate per calendar day, from the first published rate to the end of the file,
+        # so that looking up a batch of dates is a single array indexing
+        days = np.arange(dates[0], last_date + 1)
+        last_known = np.searchsorted(dates, days, side="right") - 1
+        self._first_date = dates[0]
+        self._daily_rates = rates[last_known]
+
+    def get_euro_dollar_rates(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Retrieves the EUR to USD exchange rates for an array of dates.
+
+        For days without a published rate (week-ends, holidays), the last known rate is used.
+
+        Args:
+            dates (np.ndarray): The dates for which the exchange rates are requested (datetime64[D]).
 
-        for _, row in df_usd.iterrows():
-            date_str = row["Titre :"]
-            usd = row[usd_column]
-            self.usd_change_rate_by_day[date_str] = usd
+        Returns:
+            np.ndarray: The EUR to USD exchange rates for the specified dates.
+
+        Raises:
+            KeyError: If the exchange rate data is not available for one of the dates.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        offsets = (dates - self._first_date).astype(np.int64)
+        missing = (offsets < 0) | (offsets >= len(self._daily_rates))
+        if missing.any():
+            raise KeyError(str(dates[missing][0]))
+        return self._daily_rates[offsets]
 
     def get_euro_dollar_rate(self, date: datetime) -> float:
         """
@@ -64,12 +195,36 @@ class ExchangeRateData:
         Raises:
             KeyError: If the exchange rate data is not available for this date.
         """
-        # The date is in the format "YYYY-MM-DD" in the original csv data
-        date_str = date.strftime("%Y-%m-%d")
-        return self.usd_change_rate_by_day[date_str]
+        return float(
+            self.get_euro_dollar_rates(np.array([date], dtype="datetime64[D]"))[0]
+        )
+
 
+@functools.lru_cache(maxsize=4)
+def _cached_exchange_rate_data(
+    exchange_rate_csv: Optional[Path], mtime: Optional[float]
+) -> ExchangeRateData:
+    # The modification time is part of the cache key, so that an updated file is reloaded
+    return ExchangeRateData(exchange_rate_csv)
 
-@dataclass
+
+def load_exchange_rate_data(exchange_rate_csv: Optional[Path]) -> ExchangeRateData:
+    """
+    Load the exchange rate data, reusing the data already loaded in this process for the same file.
+
+    Args:
+        exchange_rate_csv (Optional[Path]): The CSV file containing the exchange rates. Downloaded if not provided.
+
+    Returns:
+        ExchangeRateData: The exchange rate data.
+    """
+    mtime = None
+    if exchange_rate_csv and exchange_rate_csv.is_file():
+        mtime = exchange_rate_csv.stat().st_mtime
+    return _cached_exchange_rate_data(exchange_rate_csv, mtime)
+
+
+@dataclass(slots=True)
 class TransactionDetails:
     # Number of shares sold
     num_shares: int
@@ -83,7 +238,7 @@ class TransactionDetails:
     sale_price_usd: float
 
 
-@dataclass
+@dataclass(slots=True)
 class TransactionDetailsProcessed:
     # Number of shares sold
     num_shares: int
@@ -125,7 +280,7 @@ class TransactionDetailsProcessed:
     total_corrected_capital_gain_eur: float
 
 
-@dataclass
+@dataclass(slots=True)
 class TaxSummary:
     # Total acquisition gain over all transactions
     total_vest_gain_eur: float
@@ -152,9 +307,64 @@ class TaxSummary:
     total_tax_rate: float
 
 
+# Characters to remove from Schwab amounts before parsing them
+_SCHWAB_FLOAT_CLEANUP = str.maketrans("", "", "$,")
+
+
 def convert_schwab_float_format(s: str) -> float:
     # Format is $XXX,XXX.XX
-    return float(s.replace("$", "").replace(",", ""))
+    return float(s.translate(_SCHWAB_FLOAT_CLEANUP))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_schwab_date(date_str: str) -> datetime:
+    # Many lots share the same vest or sale date, so each distinct date string is only parsed once
+    # The format is always MM/DD/YYYY, splitting it is much faster than strptime
+    month, day, year = date_str.split("/")
+    return datetime(int(year), int(month), int(day))
+
+
+def _parse_transaction_details(
+    details: dict, sale_date: datetime
+) -> TransactionDetails:
+    return TransactionDetails(
+        num_shares=int(details["Shares"]),
+        sale_date=sale_date,
+        sale_price_usd=convert_schwab_float_format(details["SalePrice"]),
+        vest_date=_parse_schwab_date(details["VestDate"]),
+        vest_price_usd=convert_schwab_float_format(details["VestFairMarketValue"]),
+    )
+
+
+def _iter_transactions_details(
+    schwab_data: dict, year: int
+) -> Iterator[TransactionDetails]:
+    # Schwab dates are MM/DD/YYYY, so sales from other years can be skipped without parsing the date
+    year_suffix = f"/{year}"
+    for sale in schwab_data["Transactions"]:
+        if sale["Action"] != "Sale" or not sale["Date"].endswith(year_suffix):
+            continue
+        sale_date = _parse_schwab_date(sale["Date"])
+        transactions_in_sale = [
+            _parse_transaction_details(transaction_dict["Details"], sale_date)
+            for transaction_dict in sale["TransactionDetails"]
+        ]
+
+        # Check that we have the same number of shares as expected in the sale event and same total amount
+        # (skipped entirely when running with python -O)
+        if __debug__:
+            sale_quantity = int(sale["Quantity"])
+            sale_amount_usd = convert_schwab_float_format(sale["Amount"])
+            fees_usd = convert_schwab_float_format(sale["FeesAndCommissions"])
+            total_num_shares = 0
+            total_sale_amount_usd = -fees_usd
+            for tr in transactions_in_sale:
+                total_num_shares += tr.num_shares
+                total_sale_amount_usd += tr.num_shares * tr.sale_price_usd
+            assert total_num_shares == sale_quantity
+            assert abs(total_sale_amount_usd - sale_amount_usd) < 0.01
+
+        yield from transactions_in_sale
 
 
 def load_transactions_details(schwab_json: str, year: int):
@@ -169,49 +379,11 @@ def load_transactions_details(schwab_json: str, year: int):
         list: A list of TransactionDetails objects containing the parsed transaction details.
 
     """
-    with open(schwab_json) as jfile:
-        schwab_data = json.load(jfile)
-    sales = [d for d in schwab_data["Transactions"] if d["Action"] == "Sale"]
-    transactions_details = []
-    date_schwab_format = "%m/%d/%Y"
-    for sale in sales:
-        sale_date = datetime.strptime(sale["Date"], date_schwab_format)
-        if sale_date.year != year:
-            continue
-        # We will check at the end that the sum of the shares in the transactions is equal to the quantity in the sale event
-        # same for the total sale amount
-        sale_quantity = int(sale["Quantity"])
-        sale_amount_usd = convert_schwab_float_format(sale["Amount"])
-        fees_usd = convert_schwab_float_format(sale["FeesAndCommissions"])
-        transactions_in_sale = []
-        for transaction_dict in sale["TransactionDetails"]:
-            transaction_dict = transaction_dict["Details"]
-            transaction = TransactionDetails(
-                num_shares=int(transaction_dict["Shares"]),
-                sale_date=sale_date,
-                sale_price_usd=convert_schwab_float_format(
-                    transaction_dict["SalePrice"]
-                ),
-                vest_date=datetime.strptime(
-                    transaction_dict["VestDate"], date_schwab_format
-                ),
-                vest_price_usd=convert_schwab_float_format(
-                    transaction_dict["VestFairMarketValue"]
-                ),
-            )
-            transactions_in_sale.append(transaction)
-
-        # Check that we have the same number of shares as expected in the sale event and same total amount
-        total_num_shares = sum(tr.num_shares for tr in transactions_in_sale)
-        assert total_num_shares == sale_quantity
-        total_sale_amount_usd = (
-            sum(tr.num_shares * tr.sale_price_usd for tr in transactions_in_sale)
-            - fees_usd
-        )
-        assert abs(total_sale_amount_usd - sale_amount_usd) < 0.01
-
-        transactions_details.extend(transactions_in_sale)
-    return transactions_details
+    with open(schwab_json, "rb") as jfile:
+        content = jfile.read()
+    # orjson is much faster, but the standard library is enough if it's not installed
+    schwab_data = orjson.loads(content) if orjson else json.loads(content)
+    return list(_iter_transactions_details(schwab_data, year))
 
 
 def group_transactions(
@@ -227,7 +399,9 @@ def group_transactions(
     Returns:
         List[TransactionDetails]: A list of transactions grouped by vesting date.
     """
-    grouped_transactions = defaultdict(list)
+    # Fold the transactions on the fly: for each key, keep the total number of shares and the first transaction
+    grouped_transactions = {}
+    merged = False
 
     for transaction in transactions:
         # Group by vest date and sale date, but also by sale/vest prices (in case of multiple transactions on the same day with different prices)
@@ -235,143 +409,226 @@ def group_transactions(
         ksale_price = int(round(transaction.sale_price_usd * 1000))
         kvest_price = int(round(transaction.vest_price_usd * 1000))
         key = (transaction.vest_date, transaction.sale_date, ksale_price, kvest_price)
-        grouped_transactions[key].append(transaction)
-
-    # Now, reduce each group
-    reduced_transactions = []
-    for group in grouped_transactions.values():
-        if len(group) > 1:
-            assert all(
-                abs(tr.vest_price_usd - group[0].vest_price_usd) < 0.01 for tr in group
-            )
-            assert all(
-                abs(tr.sale_price_usd - group[0].sale_price_usd) < 0.01 for tr in group
-            )
-            transaction = TransactionDetails(
-                num_shares=sum(tr.num_shares for tr in group),
-                vest_date=group[0].vest_date,
-                vest_price_usd=group[0].vest_price_usd,
-                sale_date=group[0].sale_date,
-                sale_price_usd=group[0].sale_price_usd,
-            )
-            reduced_transactions.append(transaction)
+        group = grouped_transactions.get(key)
+        if group is None:
+            grouped_transactions[key] = [transaction.num_shares, transaction]
         else:
-            reduced_transactions.append(group[0])
+            if __debug__:
+                first = group[1]
+                assert abs(transaction.vest_price_usd - first.vest_price_usd) < 0.01
+                assert abs(transaction.sale_price_usd - first.sale_price_usd) < 0.01
+            group[0] += transaction.num_shares
+            merged = True
+
+    if not merged:
+        # Nothing to group, which is common when there are few sales
+        return list(transactions)
+
+    # Now, build the reduced transactions
+    reduced_transactions = []
+    for num_shares, first in grouped_transactions.values():
+        if num_shares != first.num_shares:
+            first = replace(first, num_shares=num_shares)
+        reduced_transactions.append(first)
 
     return reduced_transactions
 
 
-def process_transaction(
-    src: TransactionDetails, change_data: ExchangeRateData
-) -> TransactionDetailsProcessed:
+def _compute_gains(
+    num_shares: np.ndarray,
+    vest_price_usd: np.ndarray,
+    sale_price_usd: np.ndarray,
+    vest_exchange_rate: np.ndarray,
+    sale_exchange_rate: np.ndarray,
+    detention_days: np.ndarray,
+) -> Dict[str, np.ndarray]:
     """
-    Process a transaction and calculate various details related to the transaction.
+    Compute the gains and tax relief of a batch of transactions, one array element per transaction.
 
     Args:
-        src (TransactionDetails): The transaction details.
-        exchange_rate_csv (str): The path to the CSV file containing exchange rate data.
+        num_shares (np.ndarray): Number of shares sold.
+        vest_price_usd (np.ndarray): Price per share at vesting in USD.
+        sale_price_usd (np.ndarray): Price per share at sale in USD.
+        vest_exchange_rate (np.ndarray): Exchange rate EUR -> USD for the vesting date.
+        sale_exchange_rate (np.ndarray): Exchange rate EUR -> USD for the sale date.
+        detention_days (np.ndarray): Number of days between vesting and sale.
 
     Returns:
-        TransactionDetailsProcessed: The processed transaction details.
-
-    Raises:
-        FileNotFoundError: If the exchange rate CSV file is not found.
+        Dict[str, np.ndarray]: The computed columns, named after the TransactionDetailsProcessed fields.
     """
-    minimum_detention_50p = timedelta(days=2 * 365)
-    minimum_detention_65p = timedelta(days=8 * 365)
-    vest_exchange_rate = change_data.get_euro_dollar_rate(src.vest_date)
-    sale_exchange_rate = change_data.get_euro_dollar_rate(src.sale_date)
-    vest_price_eur = src.vest_price_usd / vest_exchange_rate
-    sale_price_eur = src.sale_price_usd / sale_exchange_rate
+    vest_price_eur = vest_price_usd / vest_exchange_rate
+    sale_price_eur = sale_price_usd / sale_exchange_rate
     capital_gain_eur = sale_price_eur - vest_price_eur
-    total_vest_gain_eur = src.num_shares * vest_price_eur
-    total_capital_gain_eur = src.num_shares * capital_gain_eur
-    total_sale_price_eur = src.num_shares * sale_price_eur
+    total_vest_gain_eur = num_shares * vest_price_eur
+    total_capital_gain_eur = num_shares * capital_gain_eur
+    total_sale_price_eur = num_shares * sale_price_eur
 
     # Remove capital losses from acquisition gains
-    if total_capital_gain_eur < 0:
-        if total_vest_gain_eur >= abs(total_capital_gain_eur):
-            total_corrected_vest_gain_eur = total_capital_gain_eur + total_vest_gain_eur
-            total_corrected_capital_gain_eur = 0
-        else:
-            # We cant subtract more that the total acquisition gain, so we set it to 0
-            # and still report a loss in the capital gain
-            total_corrected_vest_gain_eur = 0
-            total_corrected_capital_gain_eur = (
-                total_vest_gain_eur + total_capital_gain_eur
-            )
-    else:
-        total_corrected_vest_gain_eur = total_vest_gain_eur
-        total_corrected_capital_gain_eur = total_capital_gain_eur
+    # We cant subtract more that the total acquisition gain, so the offset is capped by it
+    # and the remaining loss is still reported in the capital gain
+    capital_loss_offset = np.minimum(
+        np.maximum(-total_capital_gain_eur, 0.0), total_vest_gain_eur
+    )
+    total_corrected_vest_gain_eur = total_vest_gain_eur - capital_loss_offset
+    total_corrected_capital_gain_eur = total_capital_gain_eur + capital_loss_offset
 
     # Check minimum detention periods for tax relief
-    detention = src.sale_date - src.vest_date
-    eligible_for_tax_relief_50p = detention > minimum_detention_50p
-    eligible_for_tax_relief_65p = detention > minimum_detention_65p
+    eligible_for_tax_relief_50p = detention_days > _MIN_DETENTION_50P_DAYS
+    eligible_for_tax_relief_65p = detention_days > _MIN_DETENTION_65P_DAYS
 
     # Calculate tax relief amount
-    if eligible_for_tax_relief_65p:
-        tax_relief = 0.65 * total_corrected_vest_gain_eur
-    elif eligible_for_tax_relief_50p:
-        tax_relief = 0.5 * total_corrected_vest_gain_eur
-    else:
-        tax_relief = 0
-
-    return TransactionDetailsProcessed(
-        num_shares=src.num_shares,
-        vest_date=src.vest_date,
-        vest_price_usd=src.vest_price_usd,
-        sale_date=src.sale_date,
-        sale_price_usd=src.sale_price_usd,
-        vest_exchange_rate=vest_exchange_rate,
-        vest_price_eur=vest_price_eur,
-        sale_exchange_rate=sale_exchange_rate,
-        sale_price_eur=sale_price_eur,
-        capital_gain_eur=capital_gain_eur,
-        total_vest_gain_eur=total_vest_gain_eur,
-        total_capital_gain_eur=total_capital_gain_eur,
-        total_sale_price_eur=total_sale_price_eur,
-        detention=detention,
-        eligible_for_tax_relief_50p=eligible_for_tax_relief_50p,
-        eligible_for_tax_relief_65p=eligible_for_tax_relief_65p,
-        taxe_relief_eur=tax_relief,
-        total_corrected_vest_gain_eur=total_corrected_vest_gain_eur,
-        total_corrected_capital_gain_eur=total_corrected_capital_gain_eur,
+    tax_relief_rate = np.where(
+        eligible_for_tax_relief_65p,
+        0.65,
+        np.where(eligible_for_tax_relief_50p, 0.5, 0.0),
+    )
+    tax_relief = tax_relief_rate * total_corrected_vest_gain_eur
+
+    return {
+        "vest_price_eur": vest_price_eur,
+        "sale_price_eur": sale_price_eur,
+        "capital_gain_eur": capital_gain_eur,
+        "total_vest_gain_eur": total_vest_gain_eur,
+        "total_capital_gain_eur": total_capital_gain_eur,
+        "total_sale_price_eur": total_sale_price_eur,
+        "eligible_for_tax_relief_50p": eligible_for_tax_relief_50p,
+        "eligible_for_tax_relief_65p": eligible_for_tax_relief_65p,
+        "taxe_relief_eur": tax_relief,
+        "total_corrected_vest_gain_eur": total_corrected_vest_gain_eur,
+        "total_corrected_capital_gain_eur": total_corrected_capital_gain_eur,
+    }
+
+
+def compute_columns(
+    transactions: List[TransactionDetails], change_data: ExchangeRateData
+) -> Dict[str, np.ndarray]:
+    """
+    Process a list of transactions column-wise, without building any per-transaction object.
+
+    Args:
+        transactions (List[TransactionDetails]): A list of transactions.
+        change_data (ExchangeRateData): The exchange rate data.
+
+    Returns:
+        Dict[str, np.ndarray]: One array per TransactionDetailsProcessed field (in the same order),
+            with one element per transaction. Dates are datetime64[D] and the detention is timedelta64[D].
+
+    Raises:
+        KeyError: If the exchange rate data is not available for a vesting or sale date.
+    """
+
+    def gather(field: str, dtype) -> np.ndarray:
+        return np.fromiter(
+            (getattr(tr, field) for tr in transactions),
+            dtype=dtype,
+            count=len(transactions),
+        )
+
+    num_shares = gather("num_shares", np.int32)
+    vest_price_usd = gather("vest_price_usd", np.float64)
+    sale_price_usd = gather("sale_price_usd", np.float64)
+    vest_date = gather("vest_date", "datetime64[D]")
+    sale_date = gather("sale_date", "datetime64[D]")
+    # Look up the vest and sale rates in a single batch
+    exchange_rates = change_data.get_euro_dollar_rates(
+        np.concatenate((vest_date, sale_date))
     )
+    vest_exchange_rate = exchange_rates[: len(transactions)]
+    sale_exchange_rate = exchange_rates[len(transactions) :]
+    detention = sale_date - vest_date
+
+    columns = {
+        "num_shares": num_shares,
+        "vest_date": vest_date,
+        "vest_price_usd": vest_price_usd,
+        "sale_date": sale_date,
+        "sale_price_usd": sale_price_usd,
+        "vest_exchange_rate": vest_exchange_rate,
+        "sale_exchange_rate": sale_exchange_rate,
+        "detention": detention,
+        **_compute_gains(
+            num_shares,
+            vest_price_usd,
+            sale_price_usd,
+            vest_exchange_rate,
+            sale_exchange_rate,
+            detention.astype(np.int32),
+        ),
+    }
+    return {f.name: columns[f.name] for f in fields(TransactionDetailsProcessed)}
+
+
+def _take_rows(
+    columns: Dict[str, np.ndarray], indices: np.ndarray
+) -> Dict[str, np.ndarray]:
+    # Select (and reorder) the same rows in all the columns
+    return {name: values[indices] for name, values in columns.items()}
 
 
-def process_all_transactions(transactions: list, change_data: ExchangeRateData) -> list:
+def columns_to_transactions(
+    columns: Dict[str, np.ndarray],
+) -> List[TransactionDetailsProcessed]:
+    """
+    Convert the columns returned by compute_columns to TransactionDetailsProcessed objects.
+
+    Args:
+        columns (Dict[str, np.ndarray]): The processed transactions, one array per field.
+
+    Returns:
+        List[TransactionDetailsProcessed]: One object per transaction, with plain Python values.
+    """
+    values_by_field = []
+    # Follow the field order, so that the objects can be built with positional arguments
+    for field in fields(TransactionDetailsProcessed):
+        values = columns[field.name]
+        if values.dtype.kind == "M":
+            # datetime64[D] would be converted to date objects, we want datetime objects
+            values = values.astype("datetime64[us]")
+        values_by_field.append(values.tolist())
+    return [TransactionDetailsProcessed(*row) for row in zip(*values_by_field)]
+
+
+def process_all_transactions(
+    transactions: List[TransactionDetails], change_data: ExchangeRateData
+) -> List[TransactionDetailsProcessed]:
     """
     Process a list of transactions and calculate various details for each transaction.
 
+    Prefer compute_columns when the per-transaction objects are not needed.
+
     Args:
-        transactions (list): A list of TransactionDetails objects.
+        transactions (List[TransactionDetails]): A list of transactions.
         change_data (ExchangeRateData): The exchange rate data.
 
     Returns:
-        list: A list of TransactionDetailsProcessed objects containing the processed transaction details.
+        List[TransactionDetailsProcessed]: The processed transaction details.
+
+    Raises:
+        KeyError: If the exchange rate data is not available for a vesting or sale date.
     """
-    return [process_transaction(tr, change_data) for tr in transactions]
+    return columns_to_transactions(compute_columns(transactions, change_data))
 
 
-def generate_summary(trs: TransactionDetailsProcessed, mtr: float) -> TaxSummary:
+def generate_summary(columns: Dict[str, np.ndarray], mtr: float) -> TaxSummary:
     """
     Summarize the processed transactions.
 
     Args:
-        trs (list): A list of TransactionDetailsProcessed objects.
+        columns (Dict[str, np.ndarray]): The processed transactions, as returned by compute_columns.
         mtr (float): Marginal tax rate
 
     Returns:
-        dict: A dictionary containing the summary of the transactions.
+        TaxSummary: The summary of the transactions.
     """
-    total_vest_gain_eur = sum(tr.total_vest_gain_eur for tr in trs)
-    total_capital_gain_eur = sum(tr.total_capital_gain_eur for tr in trs)
-    total_sale_price_eur = sum(tr.total_sale_price_eur for tr in trs)
-    total_tax_relief_eur = sum(tr.taxe_relief_eur for tr in trs)
-    total_corrected_vest_gain_eur = sum(tr.total_corrected_vest_gain_eur for tr in trs)
-    total_corrected_capital_gain_eur = sum(
-        tr.total_corrected_capital_gain_eur for tr in trs
+    total_vest_gain_eur = float(columns["total_vest_gain_eur"].sum())
+    total_capital_gain_eur = float(columns["total_capital_gain_eur"].sum())
+    total_sale_price_eur = float(columns["total_sale_price_eur"].sum())
+    total_tax_relief_eur = float(columns["taxe_relief_eur"].sum())
+    total_corrected_vest_gain_eur = float(
+        columns["total_corrected_vest_gain_eur"].sum()
+    )
+    total_corrected_capital_gain_eur = float(
+        columns["total_corrected_capital_gain_eur"].sum()
     )
 
     # Compute taxes
@@ -405,9 +662,7 @@ def generate_summary(trs: TransactionDetailsProcessed, mtr: float) -> TaxSummary
     )
 
 
-def write_output_csv(trs: List[TransactionDetailsProcessed], csv_filename: Path):
-    trs.sort(key=lambda x: (x.sale_date, x.vest_date))
-    df = pd.DataFrame(trs)
+def write_output_csv(columns: Dict[str, np.ndarray], csv_filename: Path):
     # Define the mapping between new names and old names
     column_mapping = {
         "num_shares": "Nombre de parts",
@@ -430,10 +685,27 @@ def write_output_csv(trs: List[TransactionDetailsProcessed], csv_filename: Path)
         "total_corrected_vest_gain_eur": "Gain d'acquisition apres imputation des moins-values de cession (EUR)",
         "total_corrected_capital_gain_eur": "Plus-value de cession apres imputation des moins-values de cession (EUR)",
     }
-    # Rename the columns using the mapping
-    df = df.rename(columns=column_mapping)
-    # Use this format so that Google Sheets can parse the number correctly
-    df.to_csv(csv_filename, sep="\t", float_format="%.4f", decimal=",")
+    order = np.lexsort((columns["vest_date"], columns["sale_date"]))
+    sorted_columns = _take_rows(columns, order)
+    formatted_columns = [
+        _format_csv_column(sorted_columns[name]) for name in column_mapping
+    ]
+    with open(csv_filename, "w", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        # The first column is the row number
+        writer.writerow(["", *column_mapping.values()])
+        writer.writerows(zip(range(len(order)), *formatted_columns))
+
+
+def _format_csv_column(values: np.ndarray) -> List[str]:
+    if values.dtype.kind == "f":
+        # Use this format so that Google Sheets can parse the number correctly
+        return [f"{v:.4f}".replace(".", ",") for v in values.tolist()]
+    if values.dtype.kind == "m":
+        # Detention, in days
+        return [str(v) for v in values.astype(np.int64).tolist()]
+    # Dates (YYYY-MM-DD), booleans and integers
+    return [str(v) for v in values.astype(str).tolist()]
 
 
 def write_tax_estimate(summary: TaxSummary, txt_filename: Path):
@@ -454,39 +726,40 @@ def write_tax_estimate(summary: TaxSummary, txt_filename: Path):
 
 
 def write_instructions(
-    summary: TaxSummary, trs: List[TransactionDetailsProcessed], txt_filename: Path
+    summary: TaxSummary, columns: Dict[str, np.ndarray], txt_filename: Path
 ):
     # TODO(lowik) Transaction with a remaining capital loss should be declared as well (or the capital loss should be subtracted from the total acquisition gain)
 
-    s = f"""
+    parts = [f"""
     Instructions:
     - Remplir le formulaire 2042 C
        Case 1TZ: {summary.total_corrected_vest_gain_eur - summary.total_tax_relief_eur:.0f} EUR (Gain d'acquisition apres abattement)
        Case 1UZ: {summary.total_tax_relief_eur:.0f} EUR (Abattement pour duree de detention)
        Case 3VG: {summary.total_corrected_capital_gain_eur:.0f} EUR (Plus-value de cession)
        Attention, le montant de la case 3VG sera peut etre a modifier, apres remplissage du formulaire 2074.
-    """
+    """]
 
-    trs_to_declare = [tr for tr in trs if tr.total_corrected_capital_gain_eur > 0.1]
-    trs_to_declare.sort(key=lambda x: (x.sale_date, x.vest_date))
+    to_declare = _take_rows(columns, columns["total_corrected_capital_gain_eur"] > 0.1)
+    order = np.lexsort((to_declare["vest_date"], to_declare["sale_date"]))
+    trs_to_declare = columns_to_transactions(_take_rows(to_declare, order))
 
     if not trs_to_declare:
-        s += f"""
+        parts.append(f"""
         Aucune transaction n'a de plus-value de cession a declarer.
         Vous n'avez pas besoin de remplir le formulaire 2074, ni le formulaire 2047.
-        """
+        """)
         with open(txt_filename, "w") as f:
-            f.write(s)
+            f.write("".join(parts))
         return
 
-    s += f"""
+    parts.append(f"""
     - Remplir le formulaire 2074
         Nombre de transactions a declarer: {len(trs_to_declare)}
         
-    """
+    """)
 
     for i, tr in enumerate(trs_to_declare):
-        s += f"""
+        parts.append(f"""
         -------------------------------------------------------------------
         Titre {i+1:02d}:
         - 511 (Designation): META Platforms Inc.
@@ -502,25 +775,22 @@ def write_instructions(
         - 523 (Prix de revient): {tr.total_corrected_vest_gain_eur:.0f} EUR
         - 524 (Plus-value de cession): +{tr.total_corrected_capital_gain_eur:.0f} EUR
         -------------------------------------------------------------------
-        """
+        """)
 
-    s += f"""
+    parts.append(f"""
         Notez la plus value totale obtenue.
     
         1133: Titre A / Colonne A : Recopiez la valeur obtenue, pour qu'elle soit reportee en case 3VG.
         Si la valeur est differente de celle de la case 3VG, retournez au formulaire 2042 C pour ajuster la case 3VG si besoin.
-    """
+    """)
 
-    s += f"""
+    parts.append(f"""
     - Remplir le formulaire 2047
         - Plus value avant abattement: Etats-Unis - {summary.total_corrected_capital_gain_eur:.0f} EUR (pareil que 3VG)
-    """
+    """)
 
     with open(txt_filename, "w") as f:
-        f.write(s)
-
-
-from typing import Optional
+        f.write("".join(parts))
 
 
 @click.command()
@@ -549,11 +819,11 @@ def main(
     eur_xr_csv: Optional[Path],
     mtr: float,
 ):
-    xr_data = ExchangeRateData(eur_xr_csv)
+    xr_data = load_exchange_rate_data(eur_xr_csv)
 
     transactions = load_transactions_details(schwab_json, year)
     transactions = group_transactions(transactions)
-    processed = process_all_transactions(transactions, xr_data)
+    processed = compute_columns(transactions, xr_data)
     summary = generate_summary(processed, mtr)
 
     output_dir.mkdir(exist_ok=True, parents=True)